@@ -1,11 +1,26 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import json
+from cachetools import TTLCache, cached
+import diskcache
+import fnmatch
+import hmac
 import logging
-from bs4 import BeautifulSoup
+import orjson
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Dict, List, Optional
 import os
+import threading
+import time
+
+from parsing import parse_course
+
+try:
+    import redis
+except ImportError:  # optional; only needed when REDIS_URL is set
+    redis = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -28,205 +43,279 @@ CORS(app, resources={
     }
 })
 
-# Global cache for course data
-course_cache: Dict[str, dict] = {}
+# Bounded in-process LRU of serialized course JSON, keyed by code and filled by _resolve.
+# Entries expire after a day so each worker eventually drops codes invalidated elsewhere;
+# cachetools caches are not thread-safe, so every access holds course_cache_lock
+course_cache = TTLCache(maxsize=2048, ttl=24 * 3600)
+course_cache_lock = threading.Lock()
+
+# Persistent cache of serialized course JSON and page validators, shared by workers
+# and kept across restarts. Entries are fresh for CACHE_TTL, then revalidated with a
+# conditional GET until they expire after VALIDATOR_TTL. The 2024 handbook is static,
+# so entries stay fresh for a week.
+CACHE = diskcache.Cache(os.environ.get('COURSE_CACHE_DIR', '.course_cache'), size_limit=200 * 1024 * 1024)
+CACHE_TTL = 7 * 24 * 3600
+VALIDATOR_TTL = 30 * 24 * 3600
+
+# Optional Redis cache shared by all gunicorn workers
+REDIS = redis.Redis.from_url(os.environ['REDIS_URL']) if redis and os.environ.get('REDIS_URL') else None
+
+# Shared pool for concurrent handbook fetches across requests; FETCH_WORKERS bounds
+# the in-flight upstream fetches per process
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', 16))
+EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+
+# Keep-alive session so fetch workers reuse warm connections to the handbook host
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=max(32, FETCH_WORKERS),
+    max_retries=Retry(total=2, backoff_factor=0.2)
+))
 
-def fetch_course(code: str) -> dict:
-    """Fetches and parses course information."""
+# Shared secret for the cache invalidation routes, sent in the X-Invalidate-Token
+# header; the routes are not registered at all when it is unset
+INVALIDATE_TOKEN = os.environ.get('INVALIDATE_TOKEN')
+
+# Courses preloaded into the caches on startup, e.g. WARM_CODES=33230,48024. The warm
+# runs on its own small pool so live requests keep EXECUTOR, and only the gunicorn
+# worker that claims the disk marker fetches; the others read its disk and Redis entries
+WARM_CODES = [code.strip() for code in os.environ.get('WARM_CODES', '').split(',') if code.strip()]
+WARM_WORKERS = 4
+WARM_CLAIM_TTL = 10 * 60
+warm_done = threading.Event()
+
+# Version of the /api/courses NDJSON event schema, sent as "v" on every line
+STREAM_SCHEMA_VERSION = 1
+RESULT_EVENT_PREFIX = b'{"v":%d,"type":"result","code":' % STREAM_SCHEMA_VERSION
+
+def fetch_course(code: str, cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fetches a course page and returns its serialized course JSON with the page's validators.
+    
+    When a previously cached entry is given, the request is conditional and a
+    304 Not Modified reuses its JSON without re-parsing.
+    """
     BASE_URL = "https://handbookpre2025.uts.edu.au/2024/subjects/details"
     
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    
     try:
-        response = requests.get(f"{BASE_URL}/{code}.html")
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = SESSION.get(f"{BASE_URL}/{code}.html", headers=headers, timeout=(3.05, 15))
+        if cached and response.status_code == 304:
+            # A 304 may omit validators that still describe the cached page
+            return {
+                'json': cached['json'],
+                'etag': response.headers.get('ETag') or cached['etag'],
+                'last_modified': response.headers.get('Last-Modified') or cached['last_modified'],
+                'fetched_at': time.time()
+            }
         
-        # Extract course data using helper functions
-        course_data = {
-            'code': code,
-            'title': _extract_title(soup),
-            'credit_points': _extract_credit_points(soup),
-            'requisites': _extract_requisites(soup),
-            'overview': _extract_overview(soup),
-            'learning_outcomes': _extract_learning_outcomes(soup),
-            'assessment': _extract_assessment(soup)
+        response.raise_for_status()
+        return {
+            'json': orjson.dumps(parse_course(response.content, code)),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time()
         }
-        
-        return course_data
     except Exception as e:
-        logger.error(f"Error fetching course {code}: {e}")
+        logger.error("Error fetching course %s: %s", code, e)
         raise
 
-def _extract_title(soup: BeautifulSoup) -> str:
-    """Extract course title from soup"""
-    if title_elem := soup.find('h1'):
-        return title_elem.get_text(strip=True)
-    return ''
-
-def _extract_credit_points(soup: BeautifulSoup) -> str:
-    """Extract credit points from soup"""
-    for em in soup.find_all('em'):
-        if txt := em.get_text(strip=True):
-            if txt.startswith('Credit points'):
-                return em.next_sibling.strip() if em.next_sibling else ''
-    return ''
-
-def _extract_requisites(soup: BeautifulSoup) -> str:
-    """Extract requisites from soup"""
-    for em in soup.find_all('em'):
-        if txt := em.get_text(strip=True):
-            if txt.startswith('Requisite'):
-                return em.get_text(separator=' ', strip=True).replace('Requisite(s):', '').strip()
-    return ''
-
-def _extract_overview(soup: BeautifulSoup) -> Dict:
-    """Extract course overview sections"""
-    overview = {
-        'description': '',
-        'teaching_strategies': [],
-        'topics': []
-    }
-    
-    if desc_section := _find_section(soup, 'Description'):
-        overview['description'] = _extract_section_text(desc_section)
-    
-    if strategies_section := _find_section(soup, 'Teaching and learning strategies'):
-        overview['teaching_strategies'] = _extract_section_list(strategies_section)
-    
-    if topics_section := _find_section(soup, 'Content (topics)'):
-        topics_text = _extract_section_text(topics_section)
-        if 'Topics include:' in topics_text:
-            topics = topics_text.replace('Topics include:', '').split(';')
-            overview['topics'] = [t.strip() for t in topics if t.strip()]
-    
-    return overview
+def _redis_get(code: str) -> Optional[bytes]:
+    """Read a course's JSON from the shared Redis cache, if configured"""
+    if REDIS is None:
+        return None
+    try:
+        return REDIS.get(f'course:{code}')
+    except redis.RedisError as e:
+        logger.warning("Redis read failed for %s: %s", code, e)
+    return None
 
-def _extract_learning_outcomes(soup: BeautifulSoup) -> List[Dict]:
-    """Extract learning outcomes from soup"""
-    outcomes = []
-    seen_outcomes = set()
-    
-    if slo_table := soup.find('table', class_='SLOTable'):
-        for row in slo_table.select('tr'):
-            if (th := row.find('th')) and (td := row.find('td')):
-                outcome_text = td.get_text(strip=True)
-                if outcome_text not in seen_outcomes:
-                    outcomes.append({
-                        'no': th.get_text(strip=True).rstrip('.'),
-                        'text': outcome_text
-                    })
-                    seen_outcomes.add(outcome_text)
-    
-    return outcomes
+def _redis_set(code: str, course_json: bytes) -> None:
+    """Write a course's JSON to the shared Redis cache, if configured"""
+    if REDIS is None:
+        return
+    try:
+        REDIS.set(f'course:{code}', course_json, ex=CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning("Redis write failed for %s: %s", code, e)
 
-def _extract_assessment(soup: BeautifulSoup) -> List[Dict]:
-    """Extract assessment tasks from soup"""
-    assessment = []
-    
-    if assess_section := _find_section(soup, 'Assessment'):
-        current_task = None
-        
-        for node in assess_section.find_all_next():
-            if node.name == 'h3':
-                break
-            
-            if node.name == 'h4':
-                if current_task:
-                    assessment.append(current_task)
-                current_task = {'title': node.get_text(strip=True), 'details': {}}
-            
-            elif current_task and node.name == 'table' and 'assessmentTaskTable' in (node.get('class') or []):
-                for row in node.select('tr'):
-                    if (th := row.find('th')) and (td := row.find('td')):
-                        key = th.get_text(strip=True).rstrip(':')
-                        current_task['details'][key] = td.get_text("\n", strip=True)
-        
-        if current_task:
-            assessment.append(current_task)
-    
-    return assessment
-
-def _find_section(soup: BeautifulSoup, heading: str) -> Optional[BeautifulSoup]:
-    """Find a section by its heading"""
-    return soup.find(lambda t: t.name == 'h3' and heading in t.get_text())
-
-def _extract_section_text(section: BeautifulSoup) -> str:
-    """Extract text content from a section"""
-    parts = []
-    for sibling in section.find_next_siblings():
-        if sibling.name == 'h3':
-            break
-        if sibling.name == 'p':
-            parts.append(sibling.get_text(strip=True))
-    return ' '.join(parts)
-
-def _extract_section_list(section: BeautifulSoup) -> List[str]:
-    """Extract list items from a section"""
-    items = []
-    for sibling in section.find_next_siblings():
-        if sibling.name == 'h3':
-            break
-        if sibling.name in ('p', 'ul', 'ol'):
-            text = sibling.get_text(strip=True)
-            items.extend([item.strip() for item in text.split('\n') if item.strip()])
-    return items
+def _invalidate(code: str) -> None:
+    """Drop a course from this process's cache, Redis and disk"""
+    with course_cache_lock:
+        course_cache.pop(code, None)
+    CACHE.delete(f'page:{code}')
+    if REDIS is not None:
+        try:
+            REDIS.delete(f'course:{code}')
+        except redis.RedisError as e:
+            logger.warning("Redis delete failed for %s: %s", code, e)
+
+def _matching_codes(pattern: str) -> List[str]:
+    """Codes cached in this process, on disk or in Redis that match a shell-style pattern"""
+    with course_cache_lock:
+        codes = {code for code in course_cache.keys() if isinstance(code, str) and fnmatch.fnmatchcase(code, pattern)}
+    codes.update(key[len('page:'):] for key in CACHE.iterkeys()
+                 if isinstance(key, str) and key.startswith('page:') and fnmatch.fnmatchcase(key[len('page:'):], pattern))
+    if REDIS is not None:
+        try:
+            codes.update(key.decode()[len('course:'):] for key in REDIS.scan_iter(match=f'course:{pattern}'))
+        except redis.RedisError as e:
+            logger.warning("Redis scan failed for %s: %s", pattern, e)
+    return sorted(codes)
+
+@cached(course_cache, key=lambda code: code, lock=course_cache_lock)
+def _resolve(code: str) -> bytes:
+    """Return a course's serialized JSON from Redis or disk, fetching it on a miss; memoized in course_cache"""
+    if (course_json := _redis_get(code)) is None:
+        entry = CACHE.get(f'page:{code}')
+        if entry is None or time.time() - entry['fetched_at'] > CACHE_TTL:
+            try:
+                fresh = fetch_course(code, entry)
+            except requests.RequestException as e:
+                if entry is None:
+                    raise
+                # Serve the stale copy rather than fail; disk and Redis keep the old entry, so other
+                # workers still revalidate it on their next miss
+                logger.warning("Revalidation failed for %s, serving cached copy: %s", code, e)
+                return entry['json']
+            entry = fresh
+            CACHE.set(f'page:{code}', entry, expire=VALIDATOR_TTL)
+        course_json = entry['json']
+        _redis_set(code, course_json)
+    return course_json
+
+def _warm(codes: List[str]) -> None:
+    """Resolve codes on a dedicated pool so cold starts begin with warm caches"""
+    try:
+        if not codes or not CACHE.add('warm:claimed', os.getpid(), expire=WARM_CLAIM_TTL):
+            return
+        with ThreadPoolExecutor(max_workers=WARM_WORKERS) as pool:
+            futures = {pool.submit(_resolve, code): code for code in codes}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning("Cache warm failed for %s: %s", futures[future], e)
+        logger.info("Warmed %d courses", len(codes))
+    finally:
+        warm_done.set()
+
+threading.Thread(target=_warm, args=(WARM_CODES,), daemon=True).start()
+
+def _event(event_type: str, **fields) -> bytes:
+    """Encode one NDJSON stream line in the versioned event schema"""
+    return orjson.dumps({"v": STREAM_SCHEMA_VERSION, "type": event_type, **fields}) + b"\n"
+
+def _result_event(code: str, course_json: bytes) -> bytes:
+    """Build a result stream line around already-serialized course JSON"""
+    return RESULT_EVENT_PREFIX + orjson.dumps(code) + b',"course":' + course_json + b'}\n'
 
 @app.route('/api/courses', methods=['POST'])
 def api_courses():
     try:
         data = request.get_json()
         codes = data.get('subject_codes', [])
-        logger.info(f"Received request for courses: {codes}")
+        if not isinstance(codes, list):
+            return jsonify({"error": "subject_codes must be a list"}), 400
+        logger.info("Received request for %d courses: %s", len(codes), codes)
+        # Codes key every cache tier, so normalise JSON numbers like 33230 to strings
+        unique_codes = list(dict.fromkeys(str(code) for code in codes))
         
         def generate():
-            results = []
-            total = len(codes)
+            total = len(unique_codes)
             completed = 0
+            failed = 0
+            
+            # Start fetching the in-process cache misses, then stream the hits while they run
+            # One get per code: a TTLCache entry can expire between a membership test and a read
+            with course_cache_lock:
+                cached_json = {code: course_cache.get(code) for code in unique_codes}
+            hits = {code: course_json for code, course_json in cached_json.items() if course_json is not None}
+            futures = {EXECUTOR.submit(_resolve, code): code for code in unique_codes if code not in hits}
+            for code, course_json in hits.items():
+                completed += 1
+                yield _result_event(code, course_json)
+                yield _event("progress", completed=completed, total=total, code=code)
             
-            for code in codes:
+            for future in as_completed(futures):
+                code = futures[future]
                 try:
-                    # Try cache first
-                    course = course_cache.get(code) or fetch_course(code)
-                    course_cache[code] = course
-                    results.append(course)
+                    course_json = future.result()
                     
                     completed += 1
-                    yield json.dumps({
-                        "type": "progress",
-                        "completed": completed,
-                        "total": total,
-                        "code": code
-                    }) + "\n"
+                    yield _result_event(code, course_json)
+                    yield _event("progress", completed=completed, total=total, code=code)
                     
                 except Exception as e:
-                    logger.error(f"Error processing course {code}: {e}")
-                    yield json.dumps({
-                        "type": "progress",
-                        "completed": completed,
-                        "total": total,
-                        "code": code,
-                        "error": str(e)
-                    }) + "\n"
+                    failed += 1
+                    logger.error("Error processing course %s: %s", code, e, exc_info=True)
+                    yield _event("progress", completed=completed, total=total, code=code, error=str(e))
             
-            yield json.dumps({
-                "type": "complete",
-                "results": results
-            }) + "\n"
+            logger.info("Served %d of %d courses (%d failed)", completed, total, failed)
+            yield _event("complete")
         
-        return Response(generate(), mimetype='application/x-ndjson')
+        # Tell nginx and other proxies not to buffer, so progress events arrive as they happen
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+        )
         
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def _authorized() -> bool:
+    """Whether the request carries the invalidation secret"""
+    token = request.headers.get('X-Invalidate-Token', '')
+    return hmac.compare_digest(token.encode(), INVALIDATE_TOKEN.encode())
+
+if INVALIDATE_TOKEN:
+    @app.route('/api/invalidate/<code>', methods=['POST'])
+    def invalidate(code: str):
+        """Force the next request for a course to refetch it.
+        
+        Other gunicorn workers keep their in-process copy until it is evicted.
+        """
+        if not _authorized():
+            return jsonify({"error": "forbidden"}), 403
+        _invalidate(code)
+        logger.info("Invalidated cached course %s", code)
+        return jsonify({"status": "invalidated", "code": code})
+    
+    @app.route('/api/invalidate', methods=['POST'])
+    def invalidate_matching():
+        """Force a refetch of every cached course whose code matches a shell-style pattern, e.g. {"pattern": "332*"}"""
+        if not _authorized():
+            return jsonify({"error": "forbidden"}), 403
+        pattern = (request.get_json(silent=True) or {}).get('pattern')
+        if not isinstance(pattern, str) or not pattern:
+            return jsonify({"error": "pattern is required"}), 400
+        codes = _matching_codes(pattern)
+        for code in codes:
+            _invalidate(code)
+        logger.info("Invalidated %d cached courses matching %s", len(codes), pattern)
+        return jsonify({"status": "invalidated", "codes": codes})
+
 @app.route('/api/warmup')
 def warmup():
-    """Health check endpoint"""
-    return jsonify({"status": "ready"})
+    """Health check endpoint; reports warming until the startup cache warm finishes"""
+    response = jsonify({"status": "ready" if warm_done.is_set() else "warming"})
+    # The status changes once warming finishes, so polls must not be served from a cache
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.after_request
 def add_header(response):
-    """Add cache control headers"""
-    response.cache_control.max_age = 300  # 5 minutes
+    """Add cache control headers unless the view set its own"""
+    if 'Cache-Control' not in response.headers:
+        response.cache_control.max_age = 300  # 5 minutes
     return response
 
 if __name__ == '__main__':
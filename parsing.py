@@ -0,0 +1,180 @@
+"""Parsing of UTS handbook subject pages into course dicts, shared by the API and the scraper"""
+import re
+from selectolax.lexbor import LexborHTMLParser, LexborNode
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Page chrome that never holds course content; pruned before extraction
+NON_CONTENT_TAGS = ['head', 'script', 'style', 'noscript', 'nav', 'footer']
+
+# <em> labels that introduce basic course fields, mapped to their output keys
+EM_LABEL_RE = re.compile(r'Credit points|Requisite')
+EM_FIELDS = {'Credit points': 'credit_points', 'Requisite': 'requisites'}
+
+class Section(NamedTuple):
+    """An h3 header and the sibling elements up to the next h3"""
+    header: LexborNode
+    body: List[LexborNode]
+
+def parse_course(page: bytes, code: str) -> dict:
+    """Parses course information from a handbook page's raw bytes, decoded by lexbor as UTF-8."""
+    tree = LexborHTMLParser(page)
+    tree.strip_tags(NON_CONTENT_TAGS, recursive=True)
+    sections = _index_sections(tree)
+    
+    # Extract course data using helper functions
+    return {
+        'code': code,
+        'title': _extract_title(tree),
+        **_extract_em_fields(tree),
+        'overview': _extract_overview(sections),
+        'learning_outcomes': _extract_learning_outcomes(tree),
+        'assessment': _extract_assessment(sections)
+    }
+
+def _get_text(node: LexborNode, separator: str = '') -> str:
+    """Join the stripped, non-empty text nodes under node (bs4 get_text(strip=True) semantics)"""
+    if not separator:
+        return node.text(strip=True)
+    # lexbor keeps empty pieces when stripping, so split on a character HTML text never contains
+    return separator.join(filter(None, node.text(separator='\x00', strip=True).split('\x00')))
+
+def _next_siblings(node: LexborNode) -> Iterator[LexborNode]:
+    """Yield the element siblings following node"""
+    sibling = node.next
+    while sibling is not None:
+        if sibling.is_element_node:
+            yield sibling
+        sibling = sibling.next
+
+def _row_cells(row: LexborNode) -> Tuple[Optional[LexborNode], Optional[LexborNode]]:
+    """Return a table row's first th and td cells without running a CSS query per row"""
+    th = td = None
+    for cell in row.iter():
+        if cell.tag == 'th' and th is None:
+            th = cell
+        elif cell.tag == 'td' and td is None:
+            td = cell
+    return th, td
+
+def _extract_title(tree: LexborHTMLParser) -> str:
+    """Extract course title"""
+    if title_elem := tree.css_first('h1'):
+        return _get_text(title_elem)
+    return ''
+
+def _extract_em_fields(tree: LexborHTMLParser) -> Dict[str, str]:
+    """Extract credit points and requisites from their <em> labels in a single pass"""
+    fields = dict.fromkeys(EM_FIELDS.values(), '')
+    pending = set(fields)
+    for em in tree.css('em'):
+        if not (match := EM_LABEL_RE.match(_get_text(em))):
+            continue
+        key = EM_FIELDS[match.group()]
+        if key not in pending:
+            continue
+        if key == 'credit_points':
+            sibling = em.next
+            fields[key] = sibling.text_content.strip() if sibling is not None and sibling.is_text_node else ''
+        else:
+            head, _, tail = _get_text(em, separator=' ').partition('Requisite(s):')
+            fields[key] = (head + tail).strip()
+        pending.discard(key)
+        if not pending:
+            break
+    return fields
+
+def _extract_overview(sections: Dict[str, Section]) -> Dict:
+    """Extract course overview sections"""
+    overview = {
+        'description': '',
+        'teaching_strategies': [],
+        'topics': []
+    }
+    
+    if desc_section := _find_section(sections, 'Description'):
+        overview['description'] = _extract_section_text(desc_section)
+    
+    if strategies_section := _find_section(sections, 'Teaching and learning strategies'):
+        overview['teaching_strategies'] = _extract_section_list(strategies_section)
+    
+    if topics_section := _find_section(sections, 'Content (topics)'):
+        topics_text = _extract_section_text(topics_section)
+        _, found, topics = topics_text.partition('Topics include:')
+        if found:
+            overview['topics'] = [t for t in (s.strip() for s in topics.split(';')) if t]
+    
+    return overview
+
+def _extract_learning_outcomes(tree: LexborHTMLParser) -> List[Dict]:
+    """Extract learning outcomes from tree"""
+    outcomes: Dict[str, Dict] = {}
+    
+    if slo_table := tree.css_first('table.SLOTable'):
+        for row in slo_table.css('tr'):
+            th, td = _row_cells(row)
+            if th and td:
+                outcome_text = _get_text(td)
+                if outcome_text not in outcomes:
+                    outcomes[outcome_text] = {
+                        'no': _get_text(th).rstrip('.'),
+                        'text': outcome_text
+                    }
+    
+    return list(outcomes.values())
+
+def _extract_assessment(sections: Dict[str, Section]) -> List[Dict]:
+    """Extract assessment tasks"""
+    assessment = []
+    
+    if assess_section := _find_section(sections, 'Assessment'):
+        current_task = None
+        
+        # The section body is already bounded by the next h3; lexbor's css() also
+        # matches the node itself, so top-level and nested tasks are found in order
+        for sibling in assess_section.body:
+            for node in sibling.css('h4, table.assessmentTaskTable'):
+                if node.tag == 'h4':
+                    if current_task:
+                        assessment.append(current_task)
+                    current_task = {'title': _get_text(node), 'details': {}}
+                
+                elif current_task:
+                    for row in node.css('tr'):
+                        th, td = _row_cells(row)
+                        if th and td:
+                            key = _get_text(th).rstrip(':')
+                            current_task['details'][key] = _get_text(td, separator="\n")
+        
+        if current_task:
+            assessment.append(current_task)
+    
+    return assessment
+
+def _index_sections(tree: LexborHTMLParser) -> Dict[str, Section]:
+    """Index h3 sections and their bodies by heading text in a single pass"""
+    sections = {}
+    for h3 in tree.css('h3'):
+        body = []
+        for sibling in _next_siblings(h3):
+            if sibling.tag == 'h3':
+                break
+            body.append(sibling)
+        sections.setdefault(h3.text().strip(), Section(h3, body))
+    return sections
+
+def _find_section(sections: Dict[str, Section], heading: str) -> Optional[Section]:
+    """Find a section by its heading, falling back to a substring match for decorated headers"""
+    return sections.get(heading) or next((section for text, section in sections.items() if heading in text), None)
+
+def _extract_section_text(section: Section) -> str:
+    """Extract text content from a section"""
+    return ' '.join(_get_text(node) for node in section.body if node.tag == 'p')
+
+def _extract_section_list(section: Section) -> List[str]:
+    """Extract list items from a section"""
+    items = []
+    for sibling in section.body:
+        if sibling.tag in ('p', 'ul', 'ol'):
+            text = _get_text(sibling)
+            items.extend([item.strip() for item in text.split('\n') if item.strip()])
+    return items
@@ -1,5 +1,6 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 import logging
@@ -8,6 +9,8 @@ from pathlib import Path
 from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from parsing import parse_course
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,6 +30,10 @@ class CourseScraper:
     def __init__(self, config: CourseConfig):
         self.config = config
         self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_maxsize=config.max_workers,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        ))
     
     def fetch_courses(self, codes: List[str]) -> List[Dict]:
         """Fetch multiple courses in parallel with rate limiting"""
@@ -57,24 +64,11 @@ class CourseScraper:
             response = self.session.get(url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            return self._parse_course(soup, code)
+            return parse_course(response.content, code)
         except Exception as e:
             logger.error(f"Error fetching {code}: {e}")
             return None
 
-    def _parse_course(self, soup: BeautifulSoup, code: str) -> Dict:
-        """Parse course details from soup"""
-        return {
-            'code': code,
-            'title': self._extract_title(soup),
-            'credit_points': self._extract_credit_points(soup),
-            'requisites': self._extract_requisites(soup),
-            'overview': self._extract_overview(soup),
-            'learning_outcomes': self._extract_learning_outcomes(soup),
-            'assessment': self._extract_assessment(soup)
-        }
-
     def save_courses(self, courses: List[Dict]) -> None:
         """Save courses to JSON file"""
         self.config.output_file.write_text(
@@ -83,123 +77,6 @@ class CourseScraper:
         )
         logger.info(f"Saved {len(courses)} courses to {self.config.output_file}")
 
-    def _extract_title(self, soup: BeautifulSoup) -> str:
-        """Extract course title"""
-        if title_elem := soup.find('h1'):
-            return title_elem.get_text(strip=True)
-        return ''
-
-    def _extract_credit_points(self, soup: BeautifulSoup) -> str:
-        """Extract credit points"""
-        for em in soup.find_all('em'):
-            if txt := em.get_text(strip=True):
-                if txt.startswith('Credit points'):
-                    return em.next_sibling.strip() if em.next_sibling else ''
-        return ''
-
-    def _extract_requisites(self, soup: BeautifulSoup) -> str:
-        """Extract prerequisites"""
-        for em in soup.find_all('em'):
-            if txt := em.get_text(strip=True):
-                if txt.startswith('Requisite'):
-                    return em.get_text(separator=' ', strip=True).replace('Requisite(s):', '').strip()
-        return ''
-
-    def _extract_overview(self, soup: BeautifulSoup) -> Dict:
-        """Extract course overview sections"""
-        overview = {
-            'description': '',
-            'teaching_strategies': [],
-            'topics': []
-        }
-        
-        # Extract description
-        if desc_section := self._find_section(soup, 'Description'):
-            overview['description'] = self._extract_section_text(desc_section)
-        
-        # Extract teaching strategies
-        if strategies_section := self._find_section(soup, 'Teaching and learning strategies'):
-            overview['teaching_strategies'] = self._extract_section_list(strategies_section)
-        
-        # Extract topics
-        if topics_section := self._find_section(soup, 'Content (topics)'):
-            topics_text = self._extract_section_text(topics_section)
-            if 'Topics include:' in topics_text:
-                topics = topics_text.replace('Topics include:', '').split(';')
-                overview['topics'] = [t.strip() for t in topics if t.strip()]
-        
-        return overview
-
-    def _extract_learning_outcomes(self, soup: BeautifulSoup) -> List[Dict]:
-        """Extract learning outcomes"""
-        outcomes = []
-        seen_outcomes = set()
-        
-        if slo_table := soup.find('table', class_='SLOTable'):
-            for row in slo_table.select('tr'):
-                if (th := row.find('th')) and (td := row.find('td')):
-                    outcome_text = td.get_text(strip=True)
-                    if outcome_text not in seen_outcomes:
-                        outcomes.append({
-                            'no': th.get_text(strip=True).rstrip('.'),
-                            'text': outcome_text
-                        })
-                        seen_outcomes.add(outcome_text)
-        
-        return outcomes
-
-    def _extract_assessment(self, soup: BeautifulSoup) -> List[Dict]:
-        """Extract assessment tasks"""
-        assessment = []
-        
-        if assess_section := self._find_section(soup, 'Assessment'):
-            current_task = None
-            
-            for node in assess_section.find_all_next():
-                if node.name == 'h3':
-                    break
-                
-                if node.name == 'h4':
-                    if current_task:
-                        assessment.append(current_task)
-                    current_task = {'title': node.get_text(strip=True), 'details': {}}
-                
-                elif current_task and node.name == 'table' and 'assessmentTaskTable' in (node.get('class') or []):
-                    for row in node.select('tr'):
-                        if (th := row.find('th')) and (td := row.find('td')):
-                            key = th.get_text(strip=True).rstrip(':')
-                            current_task['details'][key] = td.get_text("\n", strip=True)
-            
-            if current_task:
-                assessment.append(current_task)
-        
-        return assessment
-
-    def _find_section(self, soup: BeautifulSoup, heading: str) -> Optional[BeautifulSoup]:
-        """Find a section by its heading"""
-        return soup.find(lambda t: t.name == 'h3' and heading in t.get_text())
-
-    def _extract_section_text(self, section: BeautifulSoup) -> str:
-        """Extract text content from a section"""
-        parts = []
-        for sibling in section.find_next_siblings():
-            if sibling.name == 'h3':
-                break
-            if sibling.name == 'p':
-                parts.append(sibling.get_text(strip=True))
-        return ' '.join(parts)
-
-    def _extract_section_list(self, section: BeautifulSoup) -> List[str]:
-        """Extract list items from a section"""
-        items = []
-        for sibling in section.find_next_siblings():
-            if sibling.name == 'h3':
-                break
-            if sibling.name in ('p', 'ul', 'ol'):
-                text = sibling.get_text(strip=True)
-                items.extend([item.strip() for item in text.split('\n') if item.strip()])
-        return items
-
 def main():
     # Example subject codes
     SUBJECT_CODES = ["33230"]